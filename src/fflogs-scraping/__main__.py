@@ -1,7 +1,7 @@
 """Entry point for fflogs-scraping."""
 
-from main import main
+from main import run
 # from main import debug_dash
 
-main()
+run()
 # debug_dash()
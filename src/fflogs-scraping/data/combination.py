@@ -1,92 +1,259 @@
 """
 CSV files are read to pandas dataframes, cleaned, concatenated and summarized.
+
+Every group composition has its own subdirectory of csv files (see
+data.scraping) and is summarized separately.
 """
 
 import os
 import glob
+import hashlib
+import math
+from collections.abc import Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
 import pandas as pd
 
 
-def csv_to_dfs() -> tuple[list[pd.DataFrame], list[pd.DataFrame]]:
-    """Reads csv files.
+def read_csv(filename: str) -> pd.DataFrame:
+    """Reads a single csv file as pandas dataframe."""
+    df = pd.read_csv(filename, na_values=["-"]).fillna(0)
+    # "Limit Break" row contains useless information so we drop it.
+    return (df.set_index("Name").drop(labels="Limit Break", errors="ignore")
+            .reset_index())
 
-    Reads csv files in csv directory as pandas dataframes and adds them either
-    to a "damage", or to a "healing" list, depending on their structure.
 
-    Returns:
-      2-tuple of lists of dataframes, one for damage and one for healing.
+def unique_csv_paths(csv_path: str = None, dedup: bool = True) -> list[str]:
+    """Returns paths of csv files, leaving out files with identical content.
+
+    Only byte-identical files are left out, i.e. tables of exactly the same
+    fights. Partially overlapping reports are handled while scraping, where
+    only their fights that weren't scraped yet are downloaded (see
+    data.scraping.Scraping.parse_log()).
+
+    Args:
+      csv_path:
+        Optional path to the directory to look in, see get_csv_paths().
+      dedup:
+        A boolean that is true if files with identical content are only read
+        once, so that the same fights downloaded twice aren't counted twice.
+        If false, all paths are returned.
     """
-    dd_dfs = []
-    hd_dfs = []
-
-    for filename in get_csv_paths():
-        df = pd.read_csv(filename, na_values=["-"]).fillna(0)
-        # "Limit Break" row contains useless information so we drop it.
-        df = (df.set_index("Name").drop(labels="Limit Break", errors="ignore")
-              .reset_index())
-        if "DPS" in df.columns:
-            dd_dfs.append(df)
-        else:
-            hd_dfs.append(df)
-    return (dd_dfs, hd_dfs)
-
-
-def get_csv_paths() -> list[str]:
-    """Returns a list of relative paths to csv files in the csv directory."""
-    dirname = os.path.dirname(__file__)
-    csv_path = os.path.join(dirname, "csv")
+    paths = get_csv_paths(csv_path)
+    if not dedup:
+        return paths
+    seen = set()
+    unique = []
+    for filename in paths:
+        with open(filename, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        if digest not in seen:
+            seen.add(digest)
+            unique.append(filename)
+    return unique
+
+
+def get_csv_paths(csv_path: str = None) -> list[str]:
+    """Returns a list of relative paths to csv files in the csv directory.
+
+    Args:
+      csv_path:
+        Optional path to the directory to look in, defaults to the csv
+        directory next to this file.
+    """
+    if csv_path is None:
+        csv_path = os.path.join(os.path.dirname(__file__), "csv")
     return glob.glob(os.path.join(csv_path, "*.csv"))
 
 
-def join_dd_dfs(dd_df_list: list[pd.DataFrame]) -> pd.DataFrame:
-    """Joins multiple "damage done" dataframes to single dataframe.
+def get_comp_paths(csv_path: str = None) -> dict[str, str]:
+    """Returns a dictionary of composition labels and their directories.
 
-    Concatenates all dataframes provided into one dataframe, converts all
-    values (except for column "Name") into numeric values, reorders and renames
-    columns.
+    Args:
+      csv_path:
+        Optional path to the csv directory, see get_csv_paths().
+    """
+    if csv_path is None:
+        csv_path = os.path.join(os.path.dirname(__file__), "csv")
+    comp_paths = {}
+    for label_path in sorted(glob.glob(os.path.join(csv_path, "*",
+                                                    "comp.txt"))):
+        with open(label_path, encoding="utf-8") as f:
+            comp_paths[f.read().strip()] = os.path.dirname(label_path)
+    return comp_paths
+
+
+def join_comps(csv_path: str = None, workers: int = None,
+               chunk_size: int = 64
+               ) -> dict[str, tuple[pd.DataFrame, pd.DataFrame]]:
+    """Summarizes csv files of every group composition separately.
+
+    Every file is read exactly once, in chunks which are folded right away
+    (see fold_sums()). Compositions without both damage and healing tables
+    are left out.
+
+    Chunks are independent of each other, so they are read and converted on
+    a pool of processes. The chunks of all compositions are submitted before
+    any of them is folded, so the pool doesn't run dry between compositions,
+    and chunks are made small enough for every process to get one.
 
     Args:
-      dd_df_list:
-        A list of pandas dataframes with identical structure and data
-        referring to the "damage done" metric.
+      csv_path:
+        Optional path to the csv directory, see get_csv_paths().
+      workers:
+        Optional maximum number of processes, defaults to the number of
+        CPUs. With 1, no processes are started at all, which is what
+        multithreaded callers (like the service) should use.
+      chunk_size:
+        Integer, the maximum number of files read by one process at once.
 
     Returns:
-      The returned pd.DataFrame is the summary of the given dataframes, ready
-      to be visualized.
+      A dictionary mapping composition labels to 2-tuples of summarized
+      damage done and healing done dataframes.
     """
-    dd_df = pd.concat(dd_df_list)
-    dd_df = convert_df(dd_df, "DPS")
-    dd_df = aggregate_dd(dd_df)
-    dd_df = fix_columns_dd(dd_df)
+    workers = workers or os.cpu_count() or 1
+    comp_paths = {label: unique_csv_paths(comp_path) for label, comp_path
+                  in get_comp_paths(csv_path).items()}
+    n_files = sum(len(paths) for paths in comp_paths.values())
+    chunk_size = max(1, min(chunk_size, math.ceil(n_files / workers)))
+    chunks = {label: [paths[i:i + chunk_size]
+                      for i in range(0, len(paths), chunk_size)]
+              for label, paths in comp_paths.items()}
+
+    summaries = {}
+    with (ProcessPoolExecutor(workers) if workers > 1 and n_files > chunk_size
+          else nullcontext()) as executor:
+        # Executor.map() submits all chunks right away.
+        results = {label: map_chunks(comp_chunks, executor)
+                   for label, comp_chunks in chunks.items()}
+        for label, comp_results in results.items():
+            dd, hd = fold_sums(comp_results)
+            if dd is not None and hd is not None:
+                summaries[label] = (dd, hd)
+    return summaries
+
+
+def concat_comps(summaries: dict[str, tuple[pd.DataFrame, pd.DataFrame]]
+                 ) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Concatenates the summaries of all compositions, see join_comps().
 
-    dd_df["Parse %"] = dd_df["Parse %"].round()
-    dd_df = dd_df.round(decimals=2)
-    return dd_df
+    Returns:
+      2-tuple of damage done and healing done dataframes, with an additional
+      first column "Composition" holding the composition label.
+    """
+    return tuple(
+        pd.concat({label: dfs[i] for label, dfs in summaries.items()},
+                  names=["Composition"]).reset_index(level=0)
+        for i in range(2))
 
 
-def join_hd_dfs(hd_df_list: list[pd.DataFrame]) -> pd.DataFrame:
-    """Joins multiple "healing done" dataframes to single dataframe.
+def fold_sums(results: Iterator[dict[str, tuple[list[str], np.ndarray]]]
+              ) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Folds per player sums of chunks into summarized dataframes.
 
-    Mostly identical to join_dd_dfs(), split up into two functions because the
-    structure of the given dataframes are slightly different in both cases.
+    Files are read and converted in chunks, which are folded into per player
+    sums (see chunk_sums()) right away, instead of concatenating all files
+    first. Memory usage therefore only depends on the chunk size and the
+    number of players, not on the number of files.
+
+    Since sums are added up chunk by chunk, means can differ from the means
+    over all rows at once by floating point error, which shows as a
+    difference of 0.01 where a value is right at a rounding boundary.
 
     Args:
-      dd_df_list:
-        A list of pandas dataframes with identical structure and data
-        referring to the "healing done" metric.
+      results:
+        Iterator of chunk_sums() results of all chunks of a composition.
 
     Returns:
-      The returned pd.DataFrame is the summary of the given dataframes, ready
-      to be visualized.
+      2-tuple of summarized damage done and healing done dataframes, None
+      instead of a dataframe if there were no files of that type.
     """
-    hd_df = pd.concat(hd_df_list)
-    hd_df = convert_df(hd_df, "HPS")
-    hd_df = aggregate_hd(hd_df)
-    hd_df = fix_columns_hd(hd_df)
-
-    hd_df["Parse %"] = hd_df["Parse %"].round()
-    hd_df = hd_df.round(decimals=2)
-    return hd_df
+    sums = {"DPS": None, "HPS": None}
+    for result in results:
+        for type, (names, values) in result.items():
+            part = pd.DataFrame(values, index=pd.Index(names, name="Name"),
+                                columns=sum_columns(type) + ["count"])
+            if sums[type] is None:
+                sums[type] = part
+            else:
+                sums[type] = sums[type].add(part, fill_value=0)
+
+    dd = hd = None
+    if sums["DPS"] is not None:
+        dd = fix_columns_dd(finish_sums(sums["DPS"], "DPS"))
+        dd["Parse %"] = dd["Parse %"].round()
+        dd = dd.round(decimals=2)
+    if sums["HPS"] is not None:
+        hd = fix_columns_hd(finish_sums(sums["HPS"], "HPS"))
+        hd["Parse %"] = hd["Parse %"].round()
+        hd = hd.round(decimals=2)
+    return (dd, hd)
+
+
+def map_chunks(chunks: list[list[str]], executor: Executor = None
+               ) -> Iterator[dict[str, tuple[list[str], np.ndarray]]]:
+    """Yields chunk_sums() of all chunks, on the executor if given."""
+    if executor is None:
+        return map(chunk_sums, chunks)
+    return executor.map(chunk_sums, chunks)
+
+
+def chunk_sums(paths: list[str]) -> dict[str, tuple[list[str], np.ndarray]]:
+    """Reads and converts a chunk of csv files, returns per player sums.
+
+    Runs in worker processes, so the result is kept compact: per type
+    ("DPS"/ "HPS") a list of player names and a float array of the sums of
+    sum_columns() plus row count for each of them.
+    """
+    dfs = {"DPS": [], "HPS": []}
+    for filename in paths:
+        df = read_csv(filename)
+        dfs["DPS" if "DPS" in df.columns else "HPS"].append(df)
+
+    result = {}
+    for type, chunk in dfs.items():
+        if not chunk:
+            continue
+        df = pd.concat(chunk, ignore_index=True)
+        df["Name"] = df["Name"].astype("category")
+        sums = partial_sums(convert_df(df, type), type)
+        result[type] = (sums.index.astype(str).tolist(),
+                        sums.to_numpy(dtype="float64"))
+    return result
+
+
+def partial_sums(df: pd.DataFrame, type: str) -> pd.DataFrame:
+    """Returns per player sums and row counts of a converted dataframe.
+
+    Sums of two files can simply be added up, finish_sums() then turns them
+    into the per player aggregates: means of every column, except for the
+    total amount, which is summed up.
+    """
+    grouped = df.groupby("Name", observed=True)
+    sums = grouped[sum_columns(type)].sum()
+    sums["count"] = grouped.size()
+    return sums
+
+
+def finish_sums(sums: pd.DataFrame, type: str) -> pd.DataFrame:
+    """Turns folded sums into means, except for the "amt" sum."""
+    df = sums[sum_columns(type)].div(sums["count"], axis=0)
+    df["amt"] = sums["amt"].round().astype("int64")
+    df.index = df.index.astype(str).rename("Name")
+    return df.rename(columns={
+        "Parse %": "parse_pct", "amt_pct": "amount_pct", "amt": "amount",
+        "Overheal": "overheal", "Active": "active_pct"
+    }).reset_index()
+
+
+def sum_columns(type: str) -> list[str]:
+    """Returns the columns of converted "DPS" or "HPS" dataframes to sum."""
+    columns = ["Parse %", "amt_pct", "amt", "Active", type, f"r{type}"]
+    if type == "HPS":
+        columns.append("Overheal")
+    return columns
 
 
 def convert_df(df: pd.DataFrame, type: str) -> pd.DataFrame:
@@ -108,8 +275,10 @@ def convert_df(df: pd.DataFrame, type: str) -> pd.DataFrame:
       (except "Name" column).
     """
     df["Parse %"] = pd.to_numeric(df["Parse %"])
-    df[type] = pd.to_numeric(df[type].str.replace(",", ""))
-    df[f"r{type}"] = pd.to_numeric(df[f"r{type}"].str.replace(",", ""))
+    # Values below 1000 have no "," so whole columns might already be numeric.
+    df[type] = pd.to_numeric(df[type].astype(str).str.replace(",", ""))
+    df[f"r{type}"] = pd.to_numeric(df[f"r{type}"].astype(str)
+                                   .str.replace(",", ""))
     df["Active"] = pd.to_numeric(df["Active"].str.split("%").str[0])
     amt_series = df["Amount"].str.split("$")
     df["amt"] = pd.to_numeric(amt_series.str[0])
@@ -120,31 +289,6 @@ def convert_df(df: pd.DataFrame, type: str) -> pd.DataFrame:
     return df
 
 
-def aggregate_dd(df: pd.DataFrame) -> pd.DataFrame:
-    """Returns dataframe aggregated by "Name" column."""
-    return df.set_index("Name").groupby("Name").agg(
-        parse_pct=("Parse %", "mean"),
-        amount_pct=("amt_pct", "mean"),
-        amount=("amt", "sum"),
-        active_pct=("Active", "mean"),
-        DPS=("DPS", "mean"),
-        rDPS=("rDPS", "mean")
-    ).reset_index()
-
-
-def aggregate_hd(df: pd.DataFrame) -> pd.DataFrame:
-    """Returns dataframe aggregated by "Name" column."""
-    return df.set_index("Name").groupby("Name").agg(
-        parse_pct=("Parse %", "mean"),
-        amount_pct=("amt_pct", "mean"),
-        amount=("amt", "sum"),
-        overheal=("Overheal", "mean"),
-        active_pct=("Active", "mean"),
-        HPS=("HPS", "mean"),
-        rHPS=("rHPS", "mean")
-    ).reset_index()
-
-
 def fix_columns_dd(df: pd.DataFrame) -> pd.DataFrame:
     """Fixes and sets better looking column names for later visualization."""
     columns_titles = ["parse_pct", "Name", "amount_pct",
@@ -0,0 +1,132 @@
+"""Exports summarized data to static files, without running a Dash server.
+
+The summary is written as a single self-contained html file plus json and csv
+files for both tables. The html file mirrors the dashboard from
+data.visualization (data bars and parse colors included), but all styles are
+computed once while writing the file, so it can be opened, or attached to a
+message, without any server running.
+"""
+
+import html
+import math
+import os
+
+import pandas as pd
+
+import data.combination as dc
+import data.visualization as dv
+
+
+def export(summaries: dict[str, tuple[pd.DataFrame, pd.DataFrame]],
+           path: str = None) -> str:
+    """Writes summary.html and json/ csv files of both tables.
+
+    The json and csv files hold the tables of all group compositions, with an
+    additional "Composition" column.
+
+    Args:
+      summaries:
+        Dictionary mapping composition labels to 2-tuples of pandas
+        dataframes of summarized damage done and healing done.
+      path:
+        Directory to write the files to. Defaults to the export directory next
+        to this file, which is created if it doesn't exist yet.
+
+    Returns:
+      The path of the directory the files were written to.
+    """
+    if path is None:
+        path = os.path.join(os.path.dirname(__file__), "export")
+    os.makedirs(path, exist_ok=True)
+
+    with open(os.path.join(path, "summary.html"), "w", encoding="utf-8") as f:
+        f.write(to_html(summaries))
+    dd, hd = dc.concat_comps(summaries)
+    for name, df in (("damage_done", dd), ("healing_done", hd)):
+        df.to_json(os.path.join(path, f"{name}.json"), orient="records")
+        df.to_csv(os.path.join(path, f"{name}.csv"), index=False)
+    return path
+
+
+def to_html(summaries: dict[str, tuple[pd.DataFrame, pd.DataFrame]]) -> str:
+    """Returns a self-contained html page showing the tables of all comps."""
+    header = dv.table_styles("header")
+    data = dv.table_styles("table_data")
+    cell = dv.table_styles("cell")
+    css = (
+        "body{background-color:#0e1012;margin:0}"
+        "div.page{background-color:#161a1d;padding:40px}"
+        "h2{color:#ffffff;font-family:\"Verdana\",sans-serif}"
+        "h3{color:#c0c0c0;font-family:\"Verdana\",sans-serif}"
+        "table{width:100%;border-collapse:collapse}"
+        f"th{{background-color:{header['backgroundColor']};"
+        f"color:{header['color']}}}"
+        f"td{{background-color:{data['backgroundColor']};"
+        f"color:{data['color']}}}"
+        f"th,td{{font-size:{cell['font_size']};border:{cell['border']};"
+        "text-align:right;padding:2px 6px}"
+    )
+    sections = []
+    for label, (dd, hd) in summaries.items():
+        if len(summaries) > 1:
+            sections.append(f"<h2>Group Composition</h2>"
+                            f"<h3>{html.escape(label)}</h3>")
+        sections.append(f"<h2>Damage Done</h2>{table_html(dd)}"
+                        f"<h2>Healing Done</h2>{table_html(hd)}")
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+        f"<title>fflogs summary</title><style>{css}</style></head>"
+        "<body><div class=\"page\">"
+        + "".join(sections) +
+        "</div></body></html>"
+    )
+
+
+def table_html(df: pd.DataFrame) -> str:
+    """Converts dataframe into a html table, styled like df_to_dt() does.
+
+    Data bars are drawn for "Amount Total" and rDPS/ rHPS, parse colors are
+    applied to "Parse %". Column widths are taken from dv.column_width().
+    """
+    r_column = "rDPS" if "rDPS" in df.columns else "rHPS"
+    color = dv.bar_color(df)
+    bars = {column: (df[column].min(), df[column].max())
+            for column in ("Amount Total", r_column)}
+    widths = {style["if"]["column_id"]: style["width"]
+              for style in dv.column_width(df)}
+
+    rows = ["<tr>" + "".join(
+        f"<th style=\"width:{widths.get(column, 'auto')}\">"
+        f"{html.escape(column)}</th>" for column in df.columns) + "</tr>"]
+    for record in df.itertuples(index=False):
+        cells = []
+        for column, value in zip(df.columns, record):
+            style = ""
+            if column == "Parse %":
+                style = (f" style=\"color:{dv.parse_color(value)};"
+                         "font-weight:bold\"")
+            elif column in bars:
+                pct = bar_percentage(value, *bars[column])
+                style = (f" style=\"background:linear-gradient(90deg,"
+                         f"{color} 0%,{color} {pct}%,"
+                         f"#242a44 {pct}%,#242a44 100%)\"")
+            cells.append(f"<td{style}>"
+                         f"{html.escape(format_value(value))}</td>")
+        rows.append("<tr>" + "".join(cells) + "</tr>")
+    return "<table>" + "".join(rows) + "</table>"
+
+
+def bar_percentage(value: float, col_min: float, col_max: float) -> float:
+    """Returns data bar length in percent, as binned by dv.data_bars()."""
+    n_bins = 100
+    if col_max == col_min:
+        return 90.0
+    i = math.floor((value - col_min) / (col_max - col_min) * n_bins) + 1
+    return round(min(i, n_bins) * (1.0 / n_bins) * 90, 1)
+
+
+def format_value(value) -> str:
+    """Formats cell values, whole numbers are shown without decimals."""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
@@ -0,0 +1,201 @@
+"""Fingerprints of logs, to detect the same fights uploaded more than once.
+
+Raid nights are often uploaded twice, or split into reports that overlap. A
+report itself is identified by the code in its url. Every fight in it is
+identified by a fight key: the group composition, the encounter (boss) and
+the time the fight started. Start times are taken from the combat log, so
+the same fight has (almost) the same start time in every report it was
+uploaded in - fights of the same encounter and composition starting within
+FIGHT_TOLERANCE seconds of each other are treated as the same fight.
+
+If the fight list of a report can't be read, the whole report is identified
+by a fingerprint instead: a hash of the group composition, the encounter type
+("all", "kills" or "wipes") and the damage done table. Since the table holds
+every player's damage over all selected fights, two reports then only share
+a fingerprint if they contain exactly the same fights.
+
+The FingerprintIndex maps reports to their fingerprints, fight keys and group
+compositions and is stored as a json file, so that a report that was already
+seen in an earlier run can be recognized as a duplicate (or as having an
+unwanted composition) before any of its pages are loaded.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+# Seconds the start times of the same fight may differ between reports, e.g.
+# if it was logged by two different players.
+FIGHT_TOLERANCE = 5
+
+
+def report_key(url: str, enc_type: str) -> str:
+    """Returns a key identifying the report code and encounter type of a url.
+
+    Different urls of the same report (with or without trailing slash,
+    anchors or parameters) map to the same key.
+    """
+    return f"{report_code(url)}:{enc_type}"
+
+
+def report_code(url: str) -> str:
+    """Returns the code of a report url, the url itself if it has none."""
+    match = re.search(r"reports\/(?:a:)?([a-zA-Z0-9]{16})", url)
+    return match.group(1) if match else url
+
+
+def comp_key(comp: tuple) -> str:
+    """Returns a short hash of a group composition, independent of order."""
+    return hashlib.sha1(",".join(sorted(comp)).encode()).hexdigest()[:12]
+
+
+def comp_label(comp: tuple) -> str:
+    """Returns a readable label of a group composition."""
+    return ", ".join(sorted(comp))
+
+
+def parse_comp(text: str) -> tuple:
+    """Returns a group composition from job names (split at commas, spaces).
+
+    Job names are written as on fflogs, e.g. "DarkKnight" or "WhiteMage".
+    """
+    return tuple(job for job in re.split(r"[\s,]+", text) if job)
+
+
+def fingerprint(comp: tuple, enc_type: str, tables: list[str]) -> str:
+    """Returns a hash of composition, encounter type and table contents.
+
+    Raises:
+      ValueError: If there are no table contents, the hash would be the same
+        for every report with that composition and encounter type.
+    """
+    if not any(tables):
+        raise ValueError("Cannot fingerprint fights without table contents.")
+    content = "\n".join([",".join(sorted(comp)), enc_type] + tables)
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def fight_key(comp: tuple, encounter: int, start: int) -> str:
+    """Returns the key of a fight, see near_fight_keys().
+
+    Args:
+      comp:
+        The group composition.
+      encounter:
+        Integer, the id of the encounter (boss).
+      start:
+        Integer, the start time of the fight in seconds since the epoch.
+    """
+    return f"{comp_key(comp)}:{encounter}:{start}"
+
+
+def near_fight_keys(key: str, tolerance: int = FIGHT_TOLERANCE) -> list[str]:
+    """Returns the keys of a fight with start times up to tolerance apart."""
+    prefix, start = key.rsplit(":", 1)
+    return [f"{prefix}:{int(start) + delta}"
+            for delta in range(-tolerance, tolerance + 1)]
+
+
+def parse_fights(report: dict, enc_type: str) -> list[tuple[int, int, int]]:
+    """Returns the boss fights of a report's fight list of an encounter type.
+
+    Args:
+      report:
+        The fight list as returned by fflogs, a dictionary with the report
+        start ("start", milliseconds since the epoch) and "fights", each with
+        its "id", "boss" (0 for trash), "start_time" (milliseconds since the
+        report start) and "kill".
+      enc_type:
+        "all", "kills" or "wipes", like data.scraping.Scraping.enc_type.
+
+    Returns:
+      A list of (fight id, encounter id, start in seconds since the epoch).
+    """
+    fights = []
+    for fight in report["fights"]:
+        if not fight.get("boss"):
+            continue
+        kill = bool(fight.get("kill"))
+        if enc_type == "kills" and not kill or enc_type == "wipes" and kill:
+            continue
+        start = (report["start"] + fight["start_time"]) // 1000
+        fights.append((fight["id"], fight["boss"], start))
+    return fights
+
+
+class FingerprintIndex:
+    """Persistent mapping of report keys to fingerprints and compositions.
+
+    Attributes:
+      path:
+        Path of the json file the index is stored in.
+      reports:
+        Dictionary mapping report keys (see report_key()) to fingerprints.
+      comps:
+        Dictionary mapping report keys to group compositions (lists of jobs).
+      fights:
+        Dictionary mapping report keys to the keys of their fights (see
+        fight_key()).
+    """
+
+    def __init__(self, path: str = None):
+        """Loads the index from path, if it exists.
+
+        Args:
+          path:
+            Optional path of the json file, defaults to fingerprints.json
+            next to this file.
+        """
+        if path is None:
+            path = os.path.join(os.path.dirname(__file__),
+                                "fingerprints.json")
+        self.path = path
+        self.reports = {}
+        self.comps = {}
+        self.fights = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                index = json.load(f)
+            self.reports = index.get("reports", {})
+            self.comps = index.get("comps", {})
+            self.fights = index.get("fights", {})
+
+    def get(self, key: str) -> str:
+        """Returns the fingerprint of a report key, None if it is unknown."""
+        return self.reports.get(key)
+
+    def add(self, key: str, fingerprint: str) -> None:
+        """Adds (or updates) the fingerprint of a report key."""
+        with self._lock:
+            self.reports[key] = fingerprint
+
+    def get_comp(self, key: str) -> tuple:
+        """Returns the composition of a report key, None if it is unknown."""
+        comp = self.comps.get(key)
+        return tuple(comp) if comp is not None else None
+
+    def add_comp(self, key: str, comp: tuple) -> None:
+        """Adds (or updates) the composition of a report key."""
+        with self._lock:
+            self.comps[key] = list(comp)
+
+    def get_fights(self, key: str) -> list[str]:
+        """Returns the fight keys of a report key, None if it is unknown."""
+        return self.fights.get(key)
+
+    def add_fights(self, key: str, fights: list[str]) -> None:
+        """Adds (or updates) the fight keys of a report key."""
+        with self._lock:
+            self.fights[key] = list(fights)
+
+    def save(self) -> None:
+        """Writes the index to its json file."""
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"reports": self.reports, "comps": self.comps,
+                           "fights": self.fights}, f)
+            os.replace(tmp_path, self.path)
@@ -2,15 +2,23 @@
 
 The Scraping class makes use of a `Selenium
 <https://www.selenium.dev/documentation/>`_ Firefox Webdriver to scrape the
-logs provided. For every log, it navigates to its subpages, checks the group
+logs provided. For every log, it navigates to its subpages, reads the group
 composition and downloads both damage done and healing tables. On every site,
 it waits until the respective elements needed are actually loaded before
 continuing.
+
+Downloaded tables are sorted into one subdirectory of the csv directory per
+group composition (named by data.fingerprint.comp_key()), so that logs with
+different compositions can be summarized separately.
 """
 
 import time
+import json
 import os
 import re
+import shutil
+import tempfile
+import zipfile
 
 from bs4 import BeautifulSoup
 from selenium import webdriver
@@ -23,6 +31,34 @@ from selenium.common.exceptions import NoSuchElementException
 from selenium.common.exceptions import StaleElementReferenceException
 from selenium.common.exceptions import WebDriverException
 
+import data.fingerprint as fp
+
+
+# Firefox preferences for lean scraping: we only need the tables, so images,
+# web fonts, media and tracking requests are skipped, while the (memory and
+# disk) cache stays enabled for scripts shared between pages. Third-party
+# requests are blocked by the add-on from first_party_addon().
+LEAN_PREFERENCES = {
+    "permissions.default.image": 2,
+    "gfx.downloadable_fonts.enabled": False,
+    "media.autoplay.default": 5,
+    "media.mediasource.enabled": False,
+    "media.peerconnection.enabled": False,
+    "privacy.trackingprotection.enabled": True,
+    "network.cookie.cookieBehavior": 1,
+    "browser.cache.disk.enable": True,
+    "browser.cache.memory.enable": True,
+    "browser.cache.check_doc_frequency": 3,
+}
+
+# Domains (including their subdomains) requests may go to in lean mode, all
+# others are blocked. rpglogs.com hosts the scripts and styles of fflogs.
+FIRST_PARTY_DOMAINS = ["fflogs.com", "rpglogs.com"]
+
+# Fight list of a report (ids, encounters, start times and kills), as loaded
+# by the report pages themselves.
+FIGHTS_URL = "https://www.fflogs.com/reports/fights-and-participants/{code}/0"
+
 
 class Scraping:
     """Implementation of all necessary scraping methods.
@@ -36,10 +72,29 @@ class Scraping:
       driver:
         Firefox webdriver object.
       comp:
-        8-tuple of strings, representing job(/class)-composition in logs.
+        8-tuple of strings, representing job(/class)-composition of the log
+        currently scraped.
+      wanted_comps:
+        Set of composition keys (see fp.comp_key()) of logs to be scraped,
+        or None if logs of all compositions are scraped.
+      csv_path:
+        Path to the directory csv files are downloaded to.
+      fingerprints:
+        FingerprintIndex of reports seen in earlier runs, or None.
+      scraped_keys:
+        Set of report keys (see fp.report_key()) seen since the last reset.
+      scraped_fingerprints:
+        Set of fingerprints of the reports scraped since the last reset.
+      scraped_fights:
+        Set of keys (see fp.fight_key()) of the fights scraped since the
+        last reset.
     """
 
-    def __init__(self, logs: list[str], enc_type: str, headless: bool):
+    def __init__(self, logs: list[str], enc_type: str, headless: bool,
+                 lean: bool = True, profile_dir: str = None,
+                 csv_path: str = None,
+                 fingerprints: fp.FingerprintIndex = None,
+                 wanted_comps: set[str] = None):
         """Initializes object with given attributes, starts driver.
 
         Args:
@@ -52,68 +107,230 @@ class Scraping:
           headless:
             A boolean that is true if the Webdriver is to be started headless
             (-> invisible) and false if not, as inputted by the user.
+          lean:
+            A boolean that is true if the browser should skip everything we
+            don't need for scraping (images, fonts, media, trackers) and only
+            wait for the DOM instead of the full page on navigation.
+          profile_dir:
+            Optional path to a Firefox profile directory that is reused
+            between runs, so that the browser cache and the adblocker don't
+            have to be set up again. Created if it doesn't exist yet.
+            Firefox keeps preferences it once read from user.js, so lean and
+            not lean runs should not share a profile directory.
+          csv_path:
+            Optional path to the directory csv files are downloaded to,
+            defaults to the csv directory next to this file.
+          fingerprints:
+            Optional FingerprintIndex, used to leave out logs whose fights
+            were already scraped before loading them (see parse_log()).
+          wanted_comps:
+            Optional set of composition keys (see fp.comp_key()). Logs with
+            other compositions are left out, without loading more than their
+            summary page (or no page at all, if their composition is known
+            from the fingerprint index).
         """
-        self.logs = logs
-        self.comp = ()
-        self.enc_type = enc_type
+        if csv_path is None:
+            csv_path = os.path.join(os.path.dirname(__file__), "csv")
+        self.csv_path = csv_path
+        self.fingerprints = fingerprints
+        self.reset(logs, enc_type, wanted_comps)
 
         options = webdriver.FirefoxOptions()
         if headless:
             options.headless = True
 
-        # Before scraping new data, we first need to clear out old csv files.
-        dirname = os.path.dirname(__file__)
-        csv_path = os.path.join(dirname, "csv")
-        for filename in os.listdir(csv_path):
-            file_path = os.path.join(csv_path, filename)
-            os.unlink(file_path)
-
-        # In order to automatically download csv files, we need to create a
-        # FirefoxProfile and adjust our download preferences.
-        ffprofile = webdriver.FirefoxProfile()
-        ffprofile.set_preference("browser.download.folderList", 2)
-        ffprofile.set_preference("browser.download.manager.showWhenStarting", False)  # noqa: E501
-        ffprofile.set_preference("browser.download.dir", csv_path)
-        ffprofile.set_preference("browser.helperApps.neverAsk.saveToDisk", "csv")  # noqa: E501
-
-        # Start Firefox driver with options (headless or not) and profile.
+        # In order to automatically download csv files, we need to adjust our
+        # download preferences.
+        preferences = {
+            "browser.download.folderList": 2,
+            "browser.download.manager.showWhenStarting": False,
+            "browser.download.dir": csv_path,
+            "browser.helperApps.neverAsk.saveToDisk": "csv",
+        }
+        if lean:
+            # "eager" returns from driver.get() as soon as the DOM is ready,
+            # we wait for the elements we need in _wait_until() anyway.
+            options.page_load_strategy = "eager"
+            preferences.update(LEAN_PREFERENCES)
+
+        # Firefox uses the given directory as its profile directly (instead
+        # of a fresh temporary copy), so its cache survives the driver.
+        # Geckodriver doesn't apply preferences to such a profile, so they
+        # are written to its user.js, which Firefox reads on every start.
+        if profile_dir is None:
+            for name, value in preferences.items():
+                options.set_preference(name, value)
+        else:
+            os.makedirs(profile_dir, exist_ok=True)
+            write_user_js(profile_dir, preferences)
+            options.add_argument("-profile")
+            options.add_argument(profile_dir)
+
+        # Start Firefox driver with options (headless or not).
         # Try starting with .exe as driver, works on Windows. On other
         # operating systems this will throw WebDriverException, it is necessary
         # to install the driver yourself. In that case, we don't need to
         # specify executable_path since geckodriver is in PATH.
         try:
-            self.driver = webdriver.Firefox(ffprofile, options=options,
+            self.driver = webdriver.Firefox(options=options,
                                             executable_path="geckodriver.exe")
         except WebDriverException:
-            self.driver = webdriver.Firefox(ffprofile, options=options)
+            self.driver = webdriver.Firefox(options=options)
 
         # Since the website loads a large amount of ads, loading can take
         # pretty long - but we can significantly reduce runtime by installing
         # an adblocker.
-        # We install our adblocker (ublock origin) from an xpi file and
-        # activate it by adding it to our FirefoxProfile.
-        self.driver.install_addon("ublock_origin-1.43.0.xpi", temporary=True)
-        ffprofile.add_extension(extension="ublock_origin-1.43.0.xpi")
-
-    def parse_logs(self) -> None:
-        """Parses and scrapes all given logs."""
-        counter = 1
+        # We install our adblocker (ublock origin) from an xpi file. In a
+        # reused profile it is installed permanently, and only once.
+        if profile_dir is None:
+            self.driver.install_addon("ublock_origin-1.43.0.xpi",
+                                      temporary=True)
+        elif not os.path.exists(os.path.join(profile_dir, "extensions",
+                                             "uBlock0@raymondhill.net.xpi")):
+            self.driver.install_addon("ublock_origin-1.43.0.xpi")
+
+        # The add-on blocking third-party requests is unsigned, so it can only
+        # be installed temporarily - also in a reused profile.
+        if lean:
+            addon_dir = tempfile.mkdtemp(prefix="fflogs-addon-")
+            try:
+                self.driver.install_addon(
+                    first_party_addon(addon_dir, FIRST_PARTY_DOMAINS),
+                    temporary=True)
+            finally:
+                shutil.rmtree(addon_dir, ignore_errors=True)
+
+    def parse_logs(self, quit: bool = True) -> None:
+        """Parses and scrapes all given logs.
+
+        Args:
+          quit:
+            A boolean that is true if the driver is to be quit afterwards,
+            false if it is kept running for more logs (see reset()).
+        """
         max = len(self.logs)
-        for log in self.logs:
+        for counter, log in enumerate(self.logs, 1):
             print(f"Beginning log {counter}/{max}... ", flush=True, end=" ")
-            self._to_summary(log)
-            if not self._check_comp(self._get_comp()):
-                print("...will be left out, group comp is invalid.")
+            start = time.perf_counter()
+            status = self.parse_log(log)
+            if status == "unwanted comp":
+                print("...will be left out, group comp is not wanted.")
                 continue
-            self._to_damage_dealt()
-            self._get_damage_dealt()
-            self._to_healing_done()
-            self._get_healing_done()
-            print(f"...log {counter}/{max} finished.")
-            counter += 1
-        # We wait a split second at the end to make sure downloads are finished
+            if status == "duplicate":
+                print("...will be left out, its fights were already scraped.")
+                continue
+            if status == "failed":
+                print("...will be left out, its tables were not downloaded.")
+                continue
+            print(f"...log {counter}/{max} finished "
+                  f"({time.perf_counter() - start:.1f}s).")
+        self.wait_for_downloads()
+        if self.fingerprints is not None:
+            self.fingerprints.save()
+        if quit:
+            self._quit()
+
+    def parse_log(self, log: str) -> str:
+        """Parses and scrapes a single log.
+
+        Fights that were already scraped in this run are left out (see
+        data.fingerprint): if all fights of a log were, the whole log is
+        left out, if only some were, the tables of the remaining fights are
+        downloaded one by one. If the fingerprint index knows the log from an
+        earlier run, this is detected before any page is loaded, otherwise
+        as soon as the composition is known (but before anything is
+        downloaded).
+
+        If the fight list can't be read, the fingerprint of the damage table
+        is compared instead, which only detects logs with exactly the same
+        fights. Logs whose damage table couldn't be read either are never
+        treated as duplicates. Logs whose composition is not in wanted_comps
+        are left out as well.
+
+        Returns:
+          "scraped" if csv files were downloaded, "unwanted comp" if the log
+          was left out because of its group composition, "duplicate" if it
+          was left out because its fights were already scraped and "failed"
+          if its tables weren't all downloaded (see _sort_downloads()).
+        """
+        key = fp.report_key(log, self.enc_type)
+        if key in self.scraped_keys:
+            return "duplicate"
+        if self.fingerprints is not None:
+            known_fights = self.fingerprints.get_fights(key)
+            if known_fights and all(map(self._scraped_fight, known_fights)):
+                return "duplicate"
+            if self.fingerprints.get(key) in self.scraped_fingerprints:
+                return "duplicate"
+            self.comp = self.fingerprints.get_comp(key)
+            if self.comp is not None and not self._wanted_comp():
+                return "unwanted comp"
+
+        self._to_summary(log)
+        self.comp = self._parse_comp(self._get_comp())
+        if self.fingerprints is not None:
+            self.fingerprints.add_comp(key, self.comp)
+        if not self._wanted_comp():
+            return "unwanted comp"
+
+        fights = self._get_fights(log)
+        if self.fingerprints is not None and fights is not None:
+            self.fingerprints.add_fights(key, [f for _, f in fights])
+        if fights:
+            new_fights = [(fight_id, fight) for fight_id, fight in fights
+                          if not self._scraped_fight(fight)]
+            if not new_fights:
+                self._add_scraped(key, None, [])
+                return "duplicate"
+            if len(new_fights) < len(fights):
+                return self._parse_fights(log, key, new_fights)
+
+        self._to_damage_dealt()
+        # Without a fingerprint, the log can't be compared to others and is
+        # always scraped.
+        fingerprint = self._get_fingerprint()
+        if (fingerprint is not None
+                and fingerprint in self.scraped_fingerprints):
+            self._add_scraped(key, fingerprint, [])
+            return "duplicate"
+
+        before = self._csv_files()
+        self._get_damage_dealt()
+        self._to_healing_done()
+        self._get_healing_done()
+        # A failed log is not marked as scraped, so it can be tried again.
+        if not self._sort_downloads(before, key):
+            return "failed"
+        self._add_scraped(key, fingerprint,
+                          [f for _, f in fights] if fights else [])
+        return "scraped"
+
+    def reset(self, logs: list[str], enc_type: str,
+              wanted_comps: set[str] = None) -> None:
+        """Sets new logs to be scraped and clears out old csv files.
+
+        The driver keeps running, so one Scraping object can be used for
+        multiple sets of logs.
+        """
+        self.logs = logs
+        self.wanted_comps = wanted_comps
+        self.comp = ()
+        self.enc_type = enc_type
+        self.scraped_keys = set()
+        self.scraped_fingerprints = set()
+        self.scraped_fights = set()
+
+        # Before scraping new data, we first need to clear out old csv files.
+        for filename in os.listdir(self.csv_path):
+            file_path = os.path.join(self.csv_path, filename)
+            if os.path.isdir(file_path):
+                shutil.rmtree(file_path)
+            else:
+                os.unlink(file_path)
+
+    def wait_for_downloads(self) -> None:
+        """Waits a split second to make sure downloads are finished."""
         time.sleep(0.5)
-        self._quit()
 
     def _quit(self) -> None:
         """Closes browser/ quits driver."""
@@ -156,6 +373,34 @@ class Scraping:
         # encounters, so we don't need to do anything in that case.
         self.driver.get(url)
 
+    def _to_fight(self, log_url: str, fight_id: int) -> None:
+        """Opens the damage done page of a single fight."""
+        self.driver.get(f"{log_url}#fight={fight_id}&type=damage-done")
+
+    def _get_fights(self, log_url: str) -> list[tuple[int, str]]:
+        """Returns the fights of the current log of the wanted encounter type.
+
+        The fight list is fetched from fflogs with a script running in the
+        (already loaded) page of the log, so no page has to be loaded for it.
+
+        Returns:
+          A list of fight ids and fight keys (see fp.fight_key()), None if
+          the fight list couldn't be read.
+        """
+        url = FIGHTS_URL.format(code=fp.report_code(log_url))
+        script = """
+            const done = arguments[arguments.length - 1];
+            fetch(arguments[0]).then((r) => r.json()).then(done,
+                                                             () => done(null));
+        """
+        try:
+            report = self.driver.execute_async_script(script, url)
+            fights = fp.parse_fights(report, self.enc_type)
+        except (WebDriverException, KeyError, TypeError):
+            return None
+        return [(fight_id, fp.fight_key(self.comp, encounter, start))
+                for fight_id, encounter, start in fights]
+
     def _get_comp(self) -> str:
         """Gets html of summary page an returns the composition table."""
         self._wait_until("//table[@class='composition-table']")
@@ -164,8 +409,8 @@ class Scraping:
         comp_html = parsed_summary.find_all(class_="composition-entry")
         return str(comp_html)
 
-    def _check_comp(self, comp_html: str) -> bool:
-        """Parses html string with regex and checks group composition.
+    def _parse_comp(self, comp_html: str) -> tuple:
+        """Parses html string with regex and returns group composition.
 
         Args:
           comp_html:
@@ -173,18 +418,147 @@ class Scraping:
             the page html.
 
         Returns:
-          False if the composition tuple created shows a different group
-          composition than present in the previous logs, true otherwise.
+          A tuple of strings, the jobs(/classes) in the group.
         """
         comp = list(re.findall("\"[a-zA-Z]*\"", comp_html))
-        comp = [s.strip('"') for s in comp]
+        return tuple(s.strip('"') for s in comp)
+
+    def _parse_fights(self, log: str, key: str,
+                      fights: list[tuple[int, str]]) -> str:
+        """Downloads the tables of single fights of a log, see parse_log().
 
-        # Compare given composition with comp attribute.
-        if len(self.comp) > 0 and sorted(self.comp) != sorted(tuple(comp)):
+        Every fight gets its own pair of csv files, so in the summary it
+        counts like a log of its own.
+        """
+        status = "scraped"
+        for fight_id, fight in fights:
+            self._to_fight(log, fight_id)
+            before = self._csv_files()
+            self._get_damage_dealt()
+            self._to_healing_done()
+            self._get_healing_done()
+            if self._sort_downloads(before, f"{key}:fight{fight_id}"):
+                self.scraped_fights.add(fight)
+            else:
+                status = "failed"
+        if status == "scraped":
+            self.scraped_keys.add(key)
+        return status
+
+    def _add_scraped(self, key: str, fingerprint: str,
+                     fights: list[str]) -> None:
+        """Marks a report key, its fingerprint (if any) and fights scraped."""
+        self.scraped_keys.add(key)
+        self.scraped_fights.update(fights)
+        if fingerprint is None:
+            return
+        self.scraped_fingerprints.add(fingerprint)
+        if self.fingerprints is not None:
+            self.fingerprints.add(key, fingerprint)
+
+    def _scraped_fight(self, fight: str) -> bool:
+        """Returns True if the fight (key) was scraped since the last reset.
+
+        Fights starting up to fp.FIGHT_TOLERANCE seconds apart count as the
+        same fight.
+        """
+        return any(near in self.scraped_fights
+                   for near in fp.near_fight_keys(fight))
+
+    def _wanted_comp(self) -> bool:
+        """Returns True if the comp attribute is one of the wanted comps."""
+        return (self.wanted_comps is None
+                or fp.comp_key(self.comp) in self.wanted_comps)
+
+    def _csv_files(self) -> set[str]:
+        """Returns the names of the files in the csv directory."""
+        return {filename for filename in os.listdir(self.csv_path)
+                if os.path.isfile(os.path.join(self.csv_path, filename))}
+
+    def _sort_downloads(self, before: set[str], key: str,
+                        timeout: int = 10) -> bool:
+        """Moves the csv files of a log into the directory of its comp.
+
+        Waits until both tables are downloaded (Firefox writes to ".part"
+        files until a download is finished), then moves them into the
+        subdirectory named by the composition key. The file names are
+        prefixed with the report key, since fflogs uses the same names for
+        every log.
+
+        Nothing is moved unless exactly one damage done and one healing done
+        table were downloaded in time, so that the tables of a composition
+        always come from the same logs. A download finishing late shows up
+        as an additional file of a later log, which then fails as well.
+        Files that aren't moved stay in the csv directory, where they are
+        never read (see dc.get_comp_paths()).
+
+        Args:
+          before:
+            Set of file names in the csv directory before downloading.
+          key:
+            The report key of the log (see fp.report_key()).
+          timeout:
+            An integer, the amount of maximum seconds to wait for downloads.
+
+        Returns:
+          True if the tables were moved, False if the log failed.
+        """
+        deadline = time.perf_counter() + timeout
+        while True:
+            new = self._csv_files() - before
+            downloading = any(f.endswith(".part") for f in new)
+            done = [f for f in new if f.endswith(".csv")]
+            if len(done) >= 2 and not downloading:
+                break
+            if time.perf_counter() > deadline:
+                return False
+            time.sleep(0.1)
+        if sorted(self._table_type(f) for f in done) != ["DPS", "HPS"]:
             return False
-        else:
-            self.comp = tuple(comp)
-            return True
+
+        comp_path = os.path.join(self.csv_path, fp.comp_key(self.comp))
+        if not os.path.isdir(comp_path):
+            os.makedirs(comp_path)
+            label_path = os.path.join(comp_path, "comp.txt")
+            with open(label_path, "w", encoding="utf-8") as f:
+                f.write(fp.comp_label(self.comp))
+        prefix = key.replace(":", "-")
+        for filename in done:
+            os.replace(os.path.join(self.csv_path, filename),
+                       os.path.join(comp_path, f"{prefix}-{filename}"))
+        return True
+
+    def _table_type(self, filename: str) -> str:
+        """Returns "DPS" or "HPS" by the header of a downloaded csv file."""
+        with open(os.path.join(self.csv_path, filename),
+                  encoding="utf-8") as f:
+            header = f.readline()
+        if "DPS" in header:
+            return "DPS"
+        return "HPS" if "HPS" in header else ""
+
+    def _get_fingerprint(self) -> str:
+        """Returns the fingerprint of the table on the damage done page.
+
+        Waits until the table has rows and the csv button (which fflogs adds
+        once the table is complete) is present, so that the same thing is
+        hashed that would be downloaded.
+
+        Returns:
+          The fingerprint (see fp.fingerprint()), None if the damage table
+          couldn't be found.
+        """
+        self._wait_until("//*[contains(text(), 'DPS')]")
+        self._wait_until("//table[contains(., 'DPS')]//tbody/tr")
+        self._wait_until("buttons-csv", by=By.CLASS_NAME)
+
+        parsed_damage = BeautifulSoup(self.driver.page_source, "html.parser")
+        tables = [table.get_text(" ", strip=True)
+                  for table in parsed_damage.find_all("table")]
+        tables = [text for text in tables if "DPS" in text]
+        if not tables:
+            return None
+        return fp.fingerprint(self.comp, self.enc_type, tables)
 
     def _to_damage_dealt(self) -> None:
         """Navigates from "summary" to "damage dealt" tab."""
@@ -213,3 +587,61 @@ class Scraping:
         # Make sure that the correct table is present, then download as csv.
         self._wait_until(hps_column_xpath, by=By.XPATH)
         self._wait_until(html_class, by=By.CLASS_NAME).send_keys(Keys.ENTER)
+
+
+def write_user_js(profile_dir: str, preferences: dict) -> None:
+    """Writes preferences to the user.js file of a Firefox profile.
+
+    Preferences in user.js override the ones Firefox saved in the profile,
+    every time it is started.
+    """
+    lines = [f"user_pref({json.dumps(name)}, {json.dumps(value)});"
+             for name, value in preferences.items()]
+    with open(os.path.join(profile_dir, "user.js"), "w",
+              encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def first_party_addon(path: str, domains: list[str]) -> str:
+    """Writes a Firefox add-on blocking requests to all but the given domains.
+
+    uBlock origin only blocks requests on its filter lists. This add-on
+    cancels every request (except for the page itself) whose host isn't one
+    of the domains or one of their subdomains.
+
+    Args:
+      path:
+        Directory to write the add-on to.
+      domains:
+        A list of domains, e.g. ["fflogs.com"].
+
+    Returns:
+      The path of the add-on (xpi file).
+    """
+    manifest = {
+        "manifest_version": 2,
+        "name": "fflogs-scraping first party only",
+        "version": "1.0",
+        "permissions": ["webRequest", "webRequestBlocking", "<all_urls>"],
+        "background": {"scripts": ["background.js"]},
+        "browser_specific_settings": {
+            "gecko": {"id": "first-party@fflogs-scraping"}
+        },
+    }
+    background = f"""const domains = {json.dumps(domains)};
+browser.webRequest.onBeforeRequest.addListener((details) => {{
+  if (details.type === "main_frame") {{
+    return {{}};
+  }}
+  const host = new URL(details.url).hostname;
+  const allowed = domains.some(
+    (d) => host === d || host.endsWith("." + d));
+  return {{cancel: !allowed}};
+}}, {{urls: ["http://*/*", "https://*/*"]}}, ["blocking"]);
+"""
+    xpi_path = os.path.join(path, "first-party.xpi")
+    with zipfile.ZipFile(xpi_path, "w") as xpi:
+        xpi.writestr("manifest.json", json.dumps(manifest))
+        xpi.writestr("background.js", background)
+    return xpi_path
+
@@ -0,0 +1,220 @@
+"""Sinks writing summaries to other tools, right after combination.
+
+Every sink takes the summaries of all group compositions (see
+data.combination.join_comps()) and writes them in one go: SQLite and Parquet
+append one batch of rows per run (with a "Run" timestamp column), the
+Prometheus textfile is replaced as a whole, since it shows the latest values
+only.
+"""
+
+import abc
+import datetime
+import importlib.util
+import os
+import sqlite3
+
+import pandas as pd
+
+import data.combination as dc
+
+
+class Sink(abc.ABC):
+    """Base class of all sinks.
+
+    Attributes:
+      path:
+        Path of the file (or directory) the sink writes to.
+    """
+
+    default_name = ""
+
+    def __init__(self, path: str = None):
+        """Initializes sink with path.
+
+        Args:
+          path:
+            Optional path to write to, defaults to default_name in the export
+            directory next to this file.
+        """
+        if path is None:
+            path = os.path.join(os.path.dirname(__file__), "export",
+                                self.default_name)
+        self.path = path
+
+    @classmethod
+    def available(cls) -> bool:
+        """Returns True if everything the sink needs is installed."""
+        return True
+
+    @abc.abstractmethod
+    def write(self, summaries: dict[str, tuple[pd.DataFrame, pd.DataFrame]]
+              ) -> None:
+        """Writes summaries, implemented by every sink."""
+
+
+class SQLiteSink(Sink):
+    """Appends summaries to SQLite tables damage_done/ healing_done."""
+
+    default_name = "fflogs.sqlite"
+
+    def write(self, summaries: dict[str, tuple[pd.DataFrame, pd.DataFrame]]
+              ) -> None:
+        """Inserts all rows of a run in a single transaction.
+
+        Tables are created on first use. If any insert fails, the whole run
+        is rolled back, so the database never holds half a run.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)),
+                    exist_ok=True)
+        dd, hd = run_rows(summaries)
+        # Without an isolation level, sqlite3 doesn't open transactions on
+        # its own, so the one we begin covers all statements.
+        con = sqlite3.connect(self.path, isolation_level=None)
+        try:
+            con.execute("BEGIN")
+            try:
+                for name, df in (("damage_done", dd), ("healing_done", hd)):
+                    insert_rows(con, name, df)
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+            con.execute("COMMIT")
+        finally:
+            con.close()
+
+
+class ParquetSink(Sink):
+    """Appends summaries as new files to damage_done/ healing_done datasets.
+
+    Needs pyarrow (or fastparquet) to be installed.
+    """
+
+    default_name = "parquet"
+
+    @classmethod
+    def available(cls) -> bool:
+        """Returns True if pyarrow or fastparquet is installed."""
+        return bool(importlib.util.find_spec("pyarrow")
+                    or importlib.util.find_spec("fastparquet"))
+
+    def write(self, summaries: dict[str, tuple[pd.DataFrame, pd.DataFrame]]
+              ) -> None:
+        """Writes one parquet file per table and run.
+
+        Files are named by the run timestamp. An existing file is never
+        overwritten, writing fails with FileExistsError instead.
+        """
+        dd, hd = run_rows(summaries)
+        stamp = dd["Run"].iloc[0].replace(":", "-") if len(dd) else "empty"
+        for name, df in (("damage_done", dd), ("healing_done", hd)):
+            dataset = os.path.join(self.path, name)
+            os.makedirs(dataset, exist_ok=True)
+            with open(os.path.join(dataset, f"{stamp}.parquet"), "xb") as f:
+                df.to_parquet(f, index=False)
+
+
+class PrometheusSink(Sink):
+    """Writes summaries as gauges for the node_exporter textfile collector.
+
+    Every numeric column becomes one metric (e.g. "rDPS" of damage done ->
+    fflogs_damage_done_rdps), labeled with composition and player name.
+    """
+
+    default_name = "fflogs.prom"
+
+    def write(self, summaries: dict[str, tuple[pd.DataFrame, pd.DataFrame]]
+              ) -> None:
+        """Replaces the textfile atomically, so it is never read half-done."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)),
+                    exist_ok=True)
+        lines = []
+        for name, df in zip(("damage_done", "healing_done"),
+                            dc.concat_comps(summaries)):
+            labels = [
+                f'comp="{escape_label(comp)}",player="{escape_label(player)}"'
+                for comp, player in zip(df["Composition"], df["Player Name"])
+            ]
+            for column in df.columns.drop(["Composition", "Player Name"]):
+                metric = f"fflogs_{name}_{metric_name(column)}"
+                lines.append(f"# HELP {metric} {column} ({name}).")
+                lines.append(f"# TYPE {metric} gauge")
+                lines.extend(f"{metric}{{{label}}} {value}"
+                             for label, value in zip(labels, df[column]))
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
+
+
+SINKS = {
+    "sqlite": SQLiteSink,
+    "parquet": ParquetSink,
+    "prometheus": PrometheusSink,
+}
+
+
+def write_all(sinks: list[str],
+              summaries: dict[str, tuple[pd.DataFrame, pd.DataFrame]]
+              ) -> list[str]:
+    """Writes summaries to all sinks given by name (see SINKS).
+
+    A sink that fails is reported and skipped, so that the other sinks (and
+    everything after them) still run.
+
+    Returns:
+      A list of the names of the sinks that were written to.
+    """
+    written = []
+    for name in sinks:
+        try:
+            SINKS[name]().write(summaries)
+        except (ImportError, OSError, ValueError, sqlite3.Error) as e:
+            print(f"\nWriting to {name} failed: {e}")
+            continue
+        written.append(name)
+    return written
+
+
+def insert_rows(con: sqlite3.Connection, table: str, df: pd.DataFrame
+                ) -> None:
+    """Inserts all rows of df into table, creating it if it doesn't exist.
+
+    Runs no transaction statements itself, see SQLiteSink.write().
+    """
+    schema = pd.io.sql.get_schema(df, table, con=con)
+    con.execute(schema.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS",
+                               1))
+    columns = ", ".join(quote_name(column) for column in df.columns)
+    placeholders = ", ".join("?" * len(df.columns))
+    con.executemany(
+        f"INSERT INTO {quote_name(table)} ({columns}) VALUES ({placeholders})",
+        df.astype(object).itertuples(index=False, name=None))
+
+
+def quote_name(name: str) -> str:
+    """Quotes a table or column name for SQLite."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def run_rows(summaries: dict[str, tuple[pd.DataFrame, pd.DataFrame]]
+             ) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Returns concatenated summaries with a "Run" timestamp column.
+
+    Timestamps have microseconds, so that runs right after each other can
+    still be told apart.
+    """
+    run = datetime.datetime.now(datetime.timezone.utc).isoformat(
+        timespec="microseconds")
+    return tuple(df.assign(Run=run) for df in dc.concat_comps(summaries))
+
+
+def metric_name(column: str) -> str:
+    """Converts a column name to a Prometheus metric name suffix."""
+    return column.lower().replace("%", "pct").replace(" ", "_").strip("_")
+
+
+def escape_label(value: str) -> str:
+    """Escapes a Prometheus label value."""
+    return (str(value).replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
@@ -0,0 +1,182 @@
+"""Generates synthetic csv files shaped like the ones downloaded from fflogs.
+
+The files can be used to test and profile data.combination and
+data.visualization without scraping anything, at any volume. They follow the
+structure of the fflogs csv export: "Parse %" (or "-" without a parse),
+"Amount" as "<total>$<percent>%", comma-grouped DPS/ HPS values, "Active" and
+"Overheal" percentages and a "Limit Break" row in damage done tables.
+
+Every player has a fixed job and a base performance, so that the same player
+scores similarly across reports. How much values vary around it is set by
+the "spread" parameter.
+"""
+
+import os
+import random
+
+import data.fingerprint as fp
+
+# Jobs by role, damage done is scaled by a factor per role.
+JOBS = {
+    "tank": ["Paladin", "Warrior", "DarkKnight", "Gunbreaker"],
+    "healer": ["WhiteMage", "Scholar", "Astrologian", "Sage"],
+    "dps": ["Monk", "Dragoon", "Ninja", "Samurai", "Reaper", "Bard",
+            "Machinist", "Dancer", "BlackMage", "Summoner", "RedMage"],
+}
+ROLE_FACTORS = {"tank": 0.6, "healer": 0.45, "dps": 1.0}
+
+
+def generate(path: str, n_reports: int, n_players: int = 8,
+             n_comps: int = 1, dps_mean: float = 15000.0,
+             spread: float = 0.15, no_parse_rate: float = 0.05,
+             seed: int = None) -> list[str]:
+    """Writes damage done and healing done csv files of synthetic reports.
+
+    Reports are distributed over n_comps different group compositions, each
+    in its own subdirectory of path with a "comp.txt", like data.scraping
+    sorts downloads. Compositions differ in at least one job.
+
+    Args:
+      path:
+        Directory to write to, created if it doesn't exist yet.
+      n_reports:
+        Integer, the number of reports (-> pairs of csv files).
+      n_players:
+        Integer, the number of players per report.
+      n_comps:
+        Integer, the number of group compositions.
+      dps_mean:
+        Float, mean DPS of damage dealers, other roles are scaled down.
+      spread:
+        Float, relative standard deviation of players' values per report.
+      no_parse_rate:
+        Float, share of players without a parse ("-") per report.
+      seed:
+        Optional integer seed, the same seed generates the same files.
+
+    Returns:
+      A list of the paths of the composition directories.
+
+    Raises:
+      ValueError: If n_comps different compositions of n_players couldn't be
+        found.
+    """
+    rng = random.Random(seed)
+    groups = []
+    comp_keys = set()
+    # Random groups can share a composition, so we draw until there are
+    # enough different ones (or give up, if there aren't enough at all).
+    for _ in range(100 * n_comps):
+        if len(groups) == n_comps:
+            break
+        players = group(rng, n_players, dps_mean)
+        key = fp.comp_key(tuple(job for _, job, _, _ in players))
+        if key not in comp_keys:
+            comp_keys.add(key)
+            groups.append(players)
+    if len(groups) < n_comps:
+        raise ValueError(f"Could not find {n_comps} different group "
+                         f"compositions of {n_players} players.")
+
+    comp_paths = []
+    for players in groups:
+        comp = tuple(job for _, job, _, _ in players)
+        comp_path = os.path.join(path, fp.comp_key(comp))
+        os.makedirs(comp_path, exist_ok=True)
+        with open(os.path.join(comp_path, "comp.txt"), "w",
+                  encoding="utf-8") as f:
+            f.write(fp.comp_label(comp))
+        comp_paths.append(comp_path)
+
+    for i in range(n_reports):
+        players = groups[i % n_comps]
+        comp_path = comp_paths[i % n_comps]
+        duration = rng.uniform(300, 720)
+        with open(os.path.join(comp_path, f"report{i}-damage.csv"), "w",
+                  encoding="utf-8") as f:
+            f.write(damage_csv(rng, players, duration, spread, no_parse_rate))
+        with open(os.path.join(comp_path, f"report{i}-healing.csv"), "w",
+                  encoding="utf-8") as f:
+            f.write(healing_csv(rng, players, duration, spread,
+                                no_parse_rate))
+    return comp_paths
+
+
+def group(rng: random.Random, n_players: int, dps_mean: float
+          ) -> list[tuple[str, str, str, float]]:
+    """Returns players as (name, job, role, base DPS) with a usual comp.
+
+    A quarter of the group are tanks, a quarter healers, the rest damage
+    dealers (at least one of each role for groups of 3 or more). Jobs only
+    repeat within a role if there are more players than jobs of that role.
+    """
+    n_tanks = max(1, n_players // 4) if n_players >= 3 else 0
+    n_healers = max(1, n_players // 4) if n_players >= 3 else 0
+    n_roles = {"tank": n_tanks, "healer": n_healers,
+               "dps": n_players - n_tanks - n_healers}
+    players = []
+    for role, n in n_roles.items():
+        for job in pick_jobs(rng, JOBS[role], n):
+            i = len(players)
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}"
+            base = dps_mean * ROLE_FACTORS[role] * rng.uniform(0.8, 1.2)
+            players.append((name, job, role, base))
+    return players
+
+
+def pick_jobs(rng: random.Random, jobs: list[str], n: int) -> list[str]:
+    """Returns n jobs, drawn without replacement until all jobs are used."""
+    picked = []
+    while len(picked) < n:
+        picked.extend(rng.sample(jobs, min(n - len(picked), len(jobs))))
+    return picked
+
+
+def damage_csv(rng: random.Random, players: list, duration: float,
+               spread: float, no_parse_rate: float) -> str:
+    """Returns the content of a damage done csv file."""
+    values = [max(rng.gauss(base, base * spread), 1.0)
+              for _, _, _, base in players]
+    total = sum(values)
+    lines = ["Parse %,Name,Amount,Active,DPS,rDPS"]
+    for (name, _, _, _), dps in zip(players, values):
+        lines.append(
+            f"{parse(rng, no_parse_rate)},{name},"
+            f"\"{int(dps * duration)}${dps / total * 100:.1f}%\","
+            f"{rng.uniform(90, 100):.2f}%,"
+            f"\"{dps:,.1f}\",\"{dps * rng.uniform(0.95, 1.05):,.1f}\"")
+    lines.append("-,Limit Break,\"0$0%\",0%,\"0.0\",\"0.0\"")
+    return "\n".join(lines) + "\n"
+
+
+def healing_csv(rng: random.Random, players: list, duration: float,
+                spread: float, no_parse_rate: float) -> str:
+    """Returns the content of a healing done csv file.
+
+    Healers heal about ten times as much as everybody else.
+    """
+    bases = [base / 2 if role == "healer" else base / 20
+             for _, _, role, base in players]
+    values = [max(rng.gauss(base, base * spread), 1.0) for base in bases]
+    total = sum(values)
+    lines = ["Parse %,Name,Amount,Overheal,Active,HPS,rHPS"]
+    for (name, _, _, _), hps in zip(players, values):
+        lines.append(
+            f"{parse(rng, no_parse_rate)},{name},"
+            f"\"{int(hps * duration)}${hps / total * 100:.1f}%\","
+            f"{rng.uniform(5, 45):.1f}%,{rng.uniform(90, 100):.2f}%,"
+            f"\"{hps:,.1f}\",\"{hps * rng.uniform(0.95, 1.05):,.1f}\"")
+    return "\n".join(lines) + "\n"
+
+
+def parse(rng: random.Random, no_parse_rate: float) -> str:
+    """Returns a random parse between 0 and 100, or "-" (no parse)."""
+    if rng.random() < no_parse_rate:
+        return "-"
+    return str(rng.randint(0, 100))
+
+
+FIRST_NAMES = ["Alisaie", "Alphinaud", "Estinien", "Thancred", "Urianger",
+               "Yshtola", "Ryne", "Lyse", "Tataru", "Haurchefant"]
+LAST_NAMES = ["Leveilleur", "Wyrmblood", "Waters", "Augurelt", "Rhul",
+              "Oaklight", "Hext", "Taru", "Greystone", "Dzemael"]
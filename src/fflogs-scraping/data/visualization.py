@@ -4,68 +4,175 @@
 apps in Python (and other languages). It is built on top of Plotly.
 
 The Dashboard is built by first converting the two dataframes to Dash
-datatables. We then define the layout of our Dash app and return it.
+datatables. We then define the layout of our Dash app and return it. If logs
+of multiple group compositions were summarized, the tables of the selected
+composition are shown.
 There also are multiple methods returning "style dictionaries" that
 are used as parameters to customize parts of the Dash dashboard.
+
+For large tables, the dashboard can be built in "compact" mode. Table data and
+styles are then sent with short column ids and rounded values and responses
+are gzip-compressed (if flask-compress is installed). Plotly serializes with
+orjson whenever it is installed, in compact mode or not.
 """
 
+import importlib.util
+import re
+
 import pandas as pd
-from dash import Dash, html
+from dash import Dash, Input, Output, dcc, html
 from dash.dash_table import DataTable as DT
 
 
-def dash(df1: pd.DataFrame, df2: pd.DataFrame) -> Dash():
+def dash(summaries: dict[str, tuple[pd.DataFrame, pd.DataFrame]],
+         compact: bool = False) -> Dash():
     """Creates an interactive Dashboard with 2 sortable tables.
 
     The style.css in the assets directory sets the dashboards
     background color and the properties of the html.H2 object.
+    If logs with more than one group composition were summarized, a dropdown
+    switches between the tables of each composition.
 
     Args:
-      df1:
-        Pandas dataframe of summarized damage done.
-      df2:
-        Pandas dataframe of summarized healing done.
+      summaries:
+        Dictionary mapping composition labels to 2-tuples of pandas
+        dataframes of summarized damage done and healing done.
+      compact:
+        A boolean that is true if the dashboard should use the compact wire
+        format (see df_to_dt()) and gzip-compressed responses.
 
     Returns:
       Object of Dash class which can then be run on localhost.
     """
-    app = Dash(__name__)
-    tbl1 = df_to_dt(df1, "tbl1")
-    tbl2 = df_to_dt(df2, "tbl2")
-    return layout(app, tbl1, tbl2)
+    # flask-compress is optional, we only use it if installed.
+    compress = compact and bool(importlib.util.find_spec("flask_compress"))
+    app = Dash(__name__, compress=compress)
+
+    @app.callback(Output("tables", "children"), Input("comp", "value"),
+                  prevent_initial_call=True)
+    def show_comp(label: str) -> list:
+        """Shows the tables of the selected composition."""
+        return tables(*summaries[label], compact)
+
+    labels = list(summaries)
+    initial = tables(*summaries[labels[0]], compact) if labels else []
+    return layout(app, labels, initial)
 
 
-def layout(app: Dash, tbl1: DT, tbl2: DT) -> Dash():
-    """Creates the layout of the dash application."""
+def layout(app: Dash, labels: list[str], initial: list = None) -> Dash():
+    """Creates the layout of the dash application.
+
+    The tables of the first composition are part of the layout, so they are
+    shown without another request. The callback of the "comp" dropdown,
+    which is hidden if there is only one composition, switches them.
+    """
     app.layout = html.Div([
-        html.H2("Damage Done"),
-        tbl1,
-        html.H2("Healing Done"),
-        tbl2,
+        html.Div([
+            html.H2("Group Composition"),
+            dcc.Dropdown(labels, labels[0] if labels else None, id="comp",
+                         clearable=False,
+                         style={"color": "#0e1012"}),
+        ], style={} if len(labels) > 1 else {"display": "none"}),
+        html.Div(initial or [], id="tables"),
     ], style={"backgroundColor": "#161a1d", "padding": 40})
     return app
 
 
-def df_to_dt(df: pd.DataFrame, id: str) -> DT:
-    """Converts dataframe into DataTable, using previously defined styles."""
+def tables(df1: pd.DataFrame, df2: pd.DataFrame, compact: bool) -> list:
+    """Returns headings and DataTables of damage done and healing done."""
+    return [
+        html.H2("Damage Done"),
+        df_to_dt(df1, "tbl1", compact),
+        html.H2("Healing Done"),
+        df_to_dt(df2, "tbl2", compact),
+    ]
+
+
+def df_to_dt(df: pd.DataFrame, id: str, compact: bool = False) -> DT:
+    """Converts dataframe into DataTable, using previously defined styles.
+
+    By default, every record repeats all column names and values are sent
+    with full float precision. In compact mode, columns get short ids ("c0",
+    "c1", ...) while keeping their displayed names, values are rounded (see
+    compact_df()) and the conditional styles are rewritten to the short ids.
+    Data bars are computed from the rounded values, so that the bounds of
+    their bins match the values actually sent.
+    """
+    ids = {i: i for i in df.columns}
+    if compact:
+        ids = {name: f"c{i}" for i, name in enumerate(df.columns)}
+        df = compact_df(df)
     r_column = "rDPS" if "rDPS" in df.columns else "rHPS"
+    data_conditional = (data_bars(df, "Amount Total") +
+                        data_bars(df, r_column) +
+                        parse_colors())
+    cell_conditional = column_width(df)
+    if compact:
+        df = df.rename(columns=ids)
+        data_conditional = compact_styles(data_conditional, ids)
+        cell_conditional = compact_styles(cell_conditional, ids)
     return DT(df.to_dict("records"),
-              [{"name": i, "id": i, "selectable": True} for i in df.columns],
+              [{"name": name, "id": ids[name], "selectable": True}
+               for name in ids],
               id=id,
               sort_action="native",
               style_as_list_view=True,
               style_cell=table_styles("cell"),
               style_header=table_styles("header"),
               style_data=table_styles("table_data"),
-              style_data_conditional=(
-                  data_bars(df, "Amount Total") +
-                  data_bars(df, r_column) +
-                  parse_colors()),
-              style_cell_conditional=column_width(df)
+              style_data_conditional=data_conditional,
+              style_cell_conditional=cell_conditional
               )
 
 
-# The following 4 methods are all only relevant for the dashboards style.
+def compact_df(df: pd.DataFrame, decimals: int = 1) -> pd.DataFrame:
+    """Rounds values for the compact wire format.
+
+    Float columns are rounded to the given decimals. Columns that only hold
+    whole numbers afterwards (e.g. "Parse %", "Amount Total") are converted to
+    integers, so they are serialized without a trailing ".0".
+    """
+    df = df.round(decimals=decimals)
+    for column in df.select_dtypes("float").columns:
+        if (df[column] % 1 == 0).all():
+            df[column] = df[column].astype("int64")
+    return df
+
+
+def compact_styles(styles: list[dict], ids: dict, decimals: int = 1
+                   ) -> list[dict]:
+    """Rewrites conditional styles to short column ids.
+
+    Column names in "column_id" and in filter queries are replaced by their
+    ids, numbers in filter queries are rounded to the same decimals as the
+    data (see compact_df()) and whitespace in style values (e.g. the
+    multi-line "background" of data_bars()) is collapsed.
+    """
+    compacted = []
+    for style in styles:
+        condition = dict(style["if"])
+        if "column_id" in condition:
+            condition["column_id"] = ids.get(condition["column_id"],
+                                             condition["column_id"])
+        if "filter_query" in condition:
+            query = re.sub(r"\d+\.\d+",
+                           lambda m: f"{float(m.group()):.{decimals}f}",
+                           condition["filter_query"])
+            for name, col_id in ids.items():
+                query = query.replace(f"{{{name}}}", f"{{{col_id}}}")
+            condition["filter_query"] = query
+        compacted_style = {"if": condition}
+        for key, value in style.items():
+            if key == "if":
+                continue
+            if isinstance(value, str):
+                value = " ".join(value.split())
+            compacted_style[key] = value
+        compacted.append(compacted_style)
+    return compacted
+
+
+# The following methods are all only relevant for the dashboards style.
 
 def table_styles(part: str) -> dict:
     """Returns dictionary of styles as specified by "type"."""
@@ -107,13 +214,12 @@ def data_bars(df: pd.DataFrame, column: str) -> dict:
       A dictionary of conditional formatting that can be used to style a
       dash DataTable.
     """
-    bar_color = "#f4d44d" if "DPS" in df.columns else "#91dfd2"
+    color = bar_color(df)
     n_bins = 100
     bounds = [i * (1.0 / n_bins) for i in range(n_bins + 1)]
-    ranges = [
-        ((df[column].max() - df[column].min()) * i) + df[column].min()
-        for i in bounds
-    ]
+    col_min = df[column].min()
+    col_max = df[column].max()
+    ranges = [((col_max - col_min) * i) + col_min for i in bounds]
     styles = []
     for i in range(1, len(bounds)):
         min_bound = ranges[i - 1]
@@ -130,8 +236,8 @@ def data_bars(df: pd.DataFrame, column: str) -> dict:
             "background": (
                 f"""
                     linear-gradient(90deg,
-                    {bar_color} 0%,
-                    {bar_color} {max_bound_percentage}%,
+                    {color} 0%,
+                    {color} {max_bound_percentage}%,
                     #242a44 {max_bound_percentage}%,
                     #242a44 100%
                 """
@@ -180,70 +286,52 @@ def parse_colors() -> dict:
     I am used to seeing those colors on the original website, that's why we
     implement them here aswell.
 
-    Args:
-      df:
-        The pandas dataframe in question.
-
     Returns:
       A dictionary of conditional formatting that can be used to style a
       dash DataTable.
     """
-    styles = [
-        {
-            "if": {
-                "filter_query": "{Parse %} < 25",
-                "column_id": "Parse %"
-            },
-            "color": "#666",
-            "fontWeight": "bold"
-        },
-        {
-            "if": {
-                "filter_query": "{Parse %} > 24 && {Parse %} < 50",
-                "column_id": "Parse %"
-            },
-            "color": "#1bb607",
-            "fontWeight": "bold"
-        },
-        {
-            "if": {
-                "filter_query": "{Parse %} > 49 && {Parse %} < 75",
-                "column_id": "Parse %"
-            },
-            "color": "#035fb9",
-            "fontWeight": "bold"
-        },
-        {
-            "if": {
-                "filter_query": "{Parse %} > 74 && {Parse %} < 95",
-                "column_id": "Parse %"
-            },
-            "color": "#822dbc",
-            "fontWeight": "bold"
-        },
-        {
-            "if": {
-                "filter_query": "{Parse %} > 94 && {Parse %} < 99",
-                "column_id": "Parse %"
-            },
-            "color": "#ff8000",
-            "fontWeight": "bold"
-        },
-        {
-            "if": {
-                "filter_query": "{Parse %} = 99",
-                "column_id": "Parse %"
-            },
-            "color": "#db7ea7",
-            "fontWeight": "bold"
-        },
-        {
+    styles = []
+    lower = 0
+    for upper, color in PARSE_COLORS:
+        if upper == lower + 1:
+            query = f"{{Parse %}} = {lower}"
+        elif lower == 0:
+            query = f"{{Parse %}} < {upper}"
+        else:
+            query = f"{{Parse %}} > {lower - 1} && {{Parse %}} < {upper}"
+        styles.append({
             "if": {
-                "filter_query": "{Parse %} = 100",
+                "filter_query": query,
                 "column_id": "Parse %"
             },
-            "color": "#b29f65",
+            "color": color,
             "fontWeight": "bold"
-        },
-    ]
+        })
+        lower = upper
     return styles
+
+
+def parse_color(parse: float) -> str:
+    """Returns the color of a (rounded) parse value, see parse_colors()."""
+    for upper, color in PARSE_COLORS:
+        if parse < upper:
+            return color
+    return PARSE_COLORS[-1][1]
+
+
+def bar_color(df: pd.DataFrame) -> str:
+    """Returns data bar color, yellow for damage and turquoise for healing."""
+    return "#f4d44d" if "DPS" in df.columns else "#91dfd2"
+
+
+# Parse colors as on fflogs.com. Every color applies to parses below "upper"
+# (and above or equal to the previous "upper").
+PARSE_COLORS = [
+    (25, "#666"),
+    (50, "#1bb607"),
+    (75, "#035fb9"),
+    (95, "#822dbc"),
+    (99, "#ff8000"),
+    (100, "#db7ea7"),
+    (101, "#b29f65"),
+]
@@ -4,10 +4,30 @@ Submodules are imported and their methods are called in main() to implement the
 entire process of scraping, summarization and visualization.
 """
 
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the benchmark then skips memory usage.
+    resource = None
+
+import plotly.io as pio
+
 import user_input as ui
 import data.scraping as ds
 import data.combination as dc
 import data.visualization as dv
+import data.export as de
+import data.fingerprint as fp
+import data.sinks as sk
+import data.synthetic as sy
 
 
 def main():
@@ -15,30 +35,185 @@ def main():
     inpt = ui.user_input()
 
     print("\nStarting Webdriver...", flush=True, end=" ")
-    spider = ds.Scraping(inpt.logs, enc_type=inpt.type, headless=inpt.headless)
-    print("...Webdriver started.")
+    start = time.perf_counter()
+    spider = ds.Scraping(inpt.logs, enc_type=inpt.type, headless=inpt.headless,
+                         lean=inpt.lean, profile_dir=inpt.profile_dir,
+                         fingerprints=fp.FingerprintIndex(),
+                         wanted_comps=({fp.comp_key(c) for c in inpt.comps}
+                                       or None))
+    print(f"...Webdriver started ({time.perf_counter() - start:.1f}s).")
     spider.parse_logs()
 
     print("Combining data...", flush=True, end=" ")
-    df_lists = dc.csv_to_dfs()
-    dd = dc.join_dd_dfs(df_lists[0])
-    hd = dc.join_hd_dfs(df_lists[1])
-    print("...combination finished.")
+    summaries = dc.join_comps()
+    print(f"...combination finished ({len(summaries)} group comps).")
+    if not summaries:
+        print("No tables were downloaded, there is nothing to show.")
+        return
+    if inpt.sinks:
+        print("Writing to sinks...", flush=True, end=" ")
+        written = sk.write_all(inpt.sinks, summaries)
+        print(f"...written to {', '.join(written) or 'no sink'}.")
+
+    if inpt.export:
+        print("Exporting summary...", flush=True, end=" ")
+        path = de.export(summaries)
+        print(f"...summary exported to {path}.")
+        return
 
     print("\nLaunching Dash application on localhost:\n")
-    dv.dash(dd, hd).run_server(debug=inpt.debug,
-                               use_reloader=False,
-                               port=inpt.port)
+    dv.dash(summaries, compact=inpt.compact).run_server(debug=inpt.debug,
+                                                        use_reloader=False,
+                                                        port=inpt.port)
+
+
+def export_summary(path: str = None) -> str:
+    """main() without scraping and dash, exports existing csv files.
+
+    Returns:
+      The path of the export directory, None if there was nothing to export.
+    """
+    summaries = dc.join_comps()
+    if not summaries:
+        print("No tables were downloaded, there is nothing to show.")
+        return None
+    return de.export(summaries, path)
+
+
+def benchmark(n_reports: int = 100, n_players: int = 8, n_comps: int = 1,
+              workers: int = None, profile: bool = False, seed: int = 0,
+              dps_mean: float = 15000.0, spread: float = 0.15,
+              no_parse_rate: float = 0.05
+              ) -> dict[str, tuple[float, float]]:
+    """main() with synthetic csv files instead of scraping, timed.
+
+    Generates reports with data.synthetic in a temporary directory, then
+    times combination, building the dashboard tables (serialized like Dash
+    sends them) and the static export. After every step, the peak resident
+    memory (RSS) so far is recorded, of this process or of one of the
+    combination processes, whichever is higher. Since the peak never goes
+    down, only steps that raise it show their own memory usage - run the
+    benchmark in a fresh interpreter to compare them.
+
+    Args:
+      n_reports, n_players, n_comps, seed, dps_mean, spread, no_parse_rate:
+        See data.synthetic.generate().
+      workers:
+        Optional maximum number of processes, see dc.join_comps().
+      profile:
+        A boolean that is true if the steps after generating should also be
+        profiled with cProfile (slower), printing the top 25 functions.
+
+    Returns:
+      A dictionary mapping every step to a 2-tuple of the seconds it took
+      and the peak RSS in MB after it (None where it can't be measured).
+    """
+    timings = {}
+    memory = {"start": peak_rss()}
+    profiler = cProfile.Profile()
+    with tempfile.TemporaryDirectory(prefix="fflogs-benchmark-") as path:
+        csv_path = os.path.join(path, "csv")
+        start = time.perf_counter()
+        sy.generate(csv_path, n_reports, n_players, n_comps,
+                    dps_mean=dps_mean, spread=spread,
+                    no_parse_rate=no_parse_rate, seed=seed)
+        timings["generate"] = time.perf_counter() - start
+        memory["generate"] = peak_rss()
+
+        if profile:
+            profiler.enable()
+        start = time.perf_counter()
+        summaries = dc.join_comps(csv_path, workers=workers)
+        timings["combine"] = time.perf_counter() - start
+        memory["combine"] = peak_rss()
+
+        start = time.perf_counter()
+        for dd, hd in summaries.values():
+            pio.json.to_json_plotly(dv.tables(dd, hd, compact=False))
+        timings["render"] = time.perf_counter() - start
+        memory["render"] = peak_rss()
+
+        start = time.perf_counter()
+        de.export(summaries, os.path.join(path, "export"))
+        timings["export"] = time.perf_counter() - start
+        memory["export"] = peak_rss()
+        profiler.disable()
+
+    print(f"Benchmark: {n_reports} reports, {n_players} players, "
+          f"{n_comps} group comps")
+    if memory["start"] is not None:
+        print(f"  {'start':<9} {'':>9} {memory['start']:8.1f} MB peak RSS")
+    for step, seconds in timings.items():
+        rss = (f"{memory[step]:8.1f} MB peak RSS"
+               if memory[step] is not None else "")
+        print(f"  {step:<9} {seconds:8.3f}s {rss}")
+    if profile:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+    return {step: (seconds, memory[step])
+            for step, seconds in timings.items()}
+
+
+def peak_rss() -> float:
+    """Returns the peak RSS in MB of this process or a finished child.
+
+    Returns None if the resource module isn't available (Windows).
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is given in bytes on macOS, in kilobytes everywhere else.
+    unit = 1024 ** 2 if sys.platform == "darwin" else 1024
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / unit
 
 
 def debug_dash():
     """main() without the scraping part to work on the dashboard."""
-    df_lists = dc.csv_to_dfs()
-    dd = dc.join_dd_dfs(df_lists[0])
-    hd = dc.join_hd_dfs(df_lists[1])
-    dv.dash(dd, hd).run_server(debug=True)
+    dv.dash(dc.join_comps()).run_server(debug=True)
+
+
+def run(argv: list[str] = None) -> None:
+    """Runs main(), or benchmark() if asked for on the command line."""
+    args = parse_args(argv)
+    if not args.benchmark:
+        main()
+        return
+    benchmark(args.reports, args.players, args.comps, workers=args.workers,
+              profile=args.profile, seed=args.seed, dps_mean=args.dps_mean,
+              spread=args.spread, no_parse_rate=args.no_parse_rate)
+
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    """Parses the command line arguments of run()."""
+    parser = argparse.ArgumentParser(
+        description="Scrape fflogs, combine and visualize the tables. "
+                    "Without arguments, logs and options are asked for.")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="time the pipeline with synthetic data instead "
+                             "of scraping (see data.synthetic)")
+    bench = parser.add_argument_group("benchmark options")
+    bench.add_argument("--reports", type=int, default=100,
+                       help="number of reports (default: 100)")
+    bench.add_argument("--players", type=int, default=8,
+                       help="number of players per report (default: 8)")
+    bench.add_argument("--comps", type=int, default=1,
+                       help="number of group compositions (default: 1)")
+    bench.add_argument("--workers", type=int, default=None,
+                       help="maximum number of processes (default: CPUs)")
+    bench.add_argument("--dps-mean", type=float, default=15000.0,
+                       help="mean DPS of damage dealers (default: 15000)")
+    bench.add_argument("--spread", type=float, default=0.15,
+                       help="relative standard deviation of values "
+                            "(default: 0.15)")
+    bench.add_argument("--no-parse-rate", type=float, default=0.05,
+                       help="share of players without a parse "
+                            "(default: 0.05)")
+    bench.add_argument("--seed", type=int, default=0,
+                       help="seed of the generated data (default: 0)")
+    bench.add_argument("--profile", action="store_true",
+                       help="also profile with cProfile (slower)")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    main()
+    run()
     # debug_dash()
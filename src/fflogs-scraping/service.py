@@ -0,0 +1,206 @@
+"""Long-running scraping service with a pool of warm webdrivers.
+
+Starting Firefox and installing the adblocker takes a large part of every
+main() run. The service starts a number of Scraping objects once and keeps
+their drivers running, so that jobs only pay for the actual scraping.
+
+Jobs are posted as json to http://localhost:<port>/jobs, e.g.::
+
+    {"logs": ["https://www.fflogs.com/reports/LnjBh2tfZRyv8rpD"],
+     "enc_type": "kills",
+     "comps": [["Paladin", "Warrior", "WhiteMage", "Sage",
+                "Monk", "Ninja", "Bard", "BlackMage"]]}
+
+"comps" is optional: if given, only logs with one of these group compositions
+are scraped (see ds.Scraping), otherwise logs of all compositions.
+
+The response is streamed as json lines: one line per log as soon as it has
+been scraped (with its status, see ds.Scraping.parse_log()), then one line
+with the combined damage and healing tables of every group composition.
+Jobs wait in a queue until one of the drivers is free.
+
+The service is started from the command line, e.g.::
+
+    python service.py --port 8051 --workers 2 --profile-dir ~/fflogs-profile
+"""
+
+import argparse
+import json
+import queue
+import shutil
+import tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import WebDriverException
+
+import user_input as ui
+import data.scraping as ds
+import data.combination as dc
+import data.fingerprint as fp
+
+
+def serve(port: int = 8051, workers: int = 2, headless: bool = True,
+          profile_dir: str = None) -> None:
+    """Starts webdrivers and serves scraping jobs on localhost until stopped.
+
+    Args:
+      port:
+        Integer, the localhost port to listen on.
+      workers:
+        Integer, the number of webdrivers kept running (-> jobs that can be
+        scraped at the same time).
+      headless:
+        A boolean that is true if the Webdrivers are to be started headless.
+      profile_dir:
+        Optional path to a Firefox profile directory, see ds.Scraping. Every
+        webdriver gets its own directory, suffixed with its number.
+    """
+    server = ThreadingHTTPServer(("localhost", port), JobHandler)
+    server.headless = headless
+    server.profile_dir = profile_dir
+    server.fingerprints = fp.FingerprintIndex()
+    server.pool = queue.Queue()
+    print(f"Starting {workers} Webdrivers...", flush=True, end=" ")
+    for i in range(workers):
+        server.pool.put((i, start_spider(server, i)))
+    print(f"...listening on localhost:{port}.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        while not server.pool.empty():
+            spider = server.pool.get()[1]
+            if spider is not None:
+                stop_spider(spider)
+
+
+def start_spider(server: ThreadingHTTPServer, i: int) -> ds.Scraping:
+    """Starts the i-th Scraping object with its own download directory."""
+    profile_dir = None
+    if server.profile_dir is not None:
+        profile_dir = f"{server.profile_dir}-{i}"
+    csv_path = tempfile.mkdtemp(prefix="fflogs-csv-")
+    try:
+        return ds.Scraping([], enc_type="all", headless=server.headless,
+                           profile_dir=profile_dir,
+                           fingerprints=server.fingerprints,
+                           csv_path=csv_path)
+    except BaseException:
+        shutil.rmtree(csv_path, ignore_errors=True)
+        raise
+
+
+def stop_spider(spider: ds.Scraping) -> None:
+    """Quits the driver and removes the download directory."""
+    try:
+        spider.driver.quit()
+    except WebDriverException:
+        pass
+    shutil.rmtree(spider.csv_path, ignore_errors=True)
+
+
+class JobHandler(BaseHTTPRequestHandler):
+    """Handles POST requests to /jobs, streams back json lines."""
+
+    def do_POST(self) -> None:
+        """Validates the job, waits for a free driver and runs the job.
+
+        If the driver crashed, it is quit and its place in the pool is left
+        empty (None), the next job using that place starts a new one. Page
+        loads that time out only fail the job, the driver is kept.
+        """
+        if self.path != "/jobs":
+            self.send_error(404)
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job = json.loads(self.rfile.read(length))
+            if not isinstance(job["logs"], list):
+                raise TypeError("'logs' must be a list of urls.")
+            logs = job["logs"]
+            enc_type = job.get("enc_type", "all")
+            comps = job.get("comps") or []
+            if not all(isinstance(comp, list) for comp in list(comps)):
+                raise TypeError("Every comp must be a list of jobs.")
+            comps = [tuple(str(j) for j in comp) for comp in comps]
+        except (ValueError, KeyError, TypeError):
+            self.send_error(400, "Expected json with a list of 'logs' "
+                                 "(and optionally a list of 'comps').")
+            return
+        if enc_type not in ("all", "kills", "wipes"):
+            self.send_error(400, "'enc_type' must be all, kills or wipes.")
+            return
+        invalid = [url for url in logs if not ui.check_url(url)]
+        if invalid:
+            self.send_error(400, f"Invalid log urls: {', '.join(invalid)}")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+
+        i, spider = self.server.pool.get()
+        try:
+            if spider is None:
+                spider = start_spider(self.server, i)
+            self.run_job(spider, logs, enc_type, comps)
+        except TimeoutException as e:
+            self.send_line({"error": f"Timed out: {e.msg}"})
+        except WebDriverException as e:
+            # The driver might have crashed, so we replace it.
+            self.send_line({"error": str(e)})
+            if spider is not None:
+                stop_spider(spider)
+            spider = None
+        finally:
+            self.server.pool.put((i, spider))
+
+    def run_job(self, spider: ds.Scraping, logs: list[str],
+                enc_type: str, comps: list[tuple]) -> None:
+        """Scrapes all logs of a job and sends the combined tables.
+
+        Tables are combined in this (request) thread, forking a process pool
+        from a multithreaded server is not safe.
+        """
+        spider.reset(logs, enc_type,
+                     {fp.comp_key(comp) for comp in comps} or None)
+        for log in logs:
+            self.send_line({"log": log, "status": spider.parse_log(log)})
+        spider.wait_for_downloads()
+        self.server.fingerprints.save()
+
+        comps = [{"comp": label,
+                  "damage_done": dd.to_dict("records"),
+                  "healing_done": hd.to_dict("records")}
+                 for label, (dd, hd)
+                 in dc.join_comps(spider.csv_path, workers=1).items()]
+        self.send_line({"comps": comps})
+
+    def send_line(self, obj: dict) -> None:
+        """Writes obj as a single json line and flushes it to the client."""
+        self.wfile.write(json.dumps(obj).encode() + b"\n")
+        self.wfile.flush()
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses the command line arguments of serve()."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8051,
+                        help="localhost port to listen on (default: 8051)")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="number of webdrivers kept running (default: 2)")
+    parser.add_argument("--profile-dir", default=None,
+                        help="Firefox profile directory to reuse, suffixed "
+                             "with the number of every webdriver")
+    parser.add_argument("--show", action="store_true",
+                        help="show the webdrivers instead of running headless")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    serve(args.port, args.workers, headless=not args.show,
+          profile_dir=args.profile_dir)
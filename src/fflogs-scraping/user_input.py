@@ -11,6 +11,9 @@ import re
 import textwrap
 from collections import namedtuple
 
+import data.fingerprint as fp
+import data.sinks as sk
+
 
 def user_input():
     """User-interface utilizing match-case environment.
@@ -22,7 +25,7 @@ def user_input():
     text = textwrap.dedent("""\n
         Input '1-5' to analyze one of the log-sets previously defined.
         Defaults to 1 if ran without providing logs.
-        (3 has an invalid comp, 4 and 5 don't have kills)
+        (3 has two different comps, 4 and 5 don't have kills)
 
         Input full log url to add to the list of logs to be summarized.
 
@@ -32,19 +35,39 @@ def user_input():
             'kills': Summarize only kills in given logs (sets type='kills')
             'wipes': Summarize only wipes in given logs (sets type='wipes')
             'all': Summarize both kills and wipes in given logs (baseline)
+            'comp <jobs>': Only scrape logs with this group composition, jobs
+                as on fflogs separated by commas, e.g. 'comp Paladin,
+                Warrior, WhiteMage, Sage, Monk, Ninja, Bard, BlackMage'.
+                Can be repeated for more comps, 'comp' alone to scrape logs
+                of all comps (baseline)
+            'lean': Switch lean browser (no images, fonts, media, trackers)
+                on/off (on baseline)
+            'profile <path>': Reuse Firefox profile directory <path> between
+                runs, 'profile' alone to use a fresh profile (baseline)
             'debug': Switch dash debug mode on/off (off baseline)
+            'compact': Switch compact dashboard data on/off (off baseline)
+            'export': Switch static export (no dash) on/off (off baseline)
+            'sqlite', 'parquet', 'prometheus': Switch export of summaries to
+                the respective sink on/off (all off baseline, parquet needs
+                pyarrow or fastparquet)
             <port>: Specify localhost port for dash to run on (default: 8050)
 
         Input 'config' to show current configuration.
         Input 'run' to start the process, 'exit' to abort.""")
     print(text)
 
-    FullInput = namedtuple("FullInput", ["logs", "headless", "type", "debug", "port"])  # noqa: E501
+    FullInput = namedtuple("FullInput", ["logs", "headless", "type", "debug", "port", "compact", "export", "sinks", "lean", "profile_dir", "comps"])  # noqa: E501
     logs = []
     type = "all"
     headless = True
+    lean = True
+    profile_dir = None
+    comps = []
     debug = False
     port = 8050
+    compact = False
+    export = False
+    sinks = []
 
     while True:
         user_input = input("Input: ")
@@ -61,6 +84,27 @@ def user_input():
             case "hide":
                 print("Scraping will not be shown.")
                 headless = True
+            case "comp":
+                print("Logs of all group comps will be scraped.")
+                comps = []
+            case _ if user_input.startswith("comp "):
+                comp = fp.parse_comp(user_input.removeprefix("comp "))
+                comps.append(comp)
+                print(f"Logs with group comp {fp.comp_label(comp)} will be "
+                      "scraped.")
+            case "lean":
+                if lean:
+                    print("Lean browser disabled.")
+                    lean = False
+                else:
+                    print("Lean browser enabled.")
+                    lean = True
+            case "profile":
+                print("Firefox will use a fresh profile.")
+                profile_dir = None
+            case _ if user_input.startswith("profile "):
+                profile_dir = user_input.removeprefix("profile ").strip()
+                print(f"Firefox will reuse the profile in {profile_dir}.")
             case "debug":
                 if debug:
                     print("Dash debug mode disabled.")
@@ -68,13 +112,43 @@ def user_input():
                 else:
                     print("Dash debug mode enabled.")
                     debug = True
+            case "compact":
+                if compact:
+                    print("Compact dashboard data disabled.")
+                    compact = False
+                else:
+                    print("Compact dashboard data enabled.")
+                    compact = True
+            case "export":
+                if export:
+                    print("Static export disabled, dash will be launched.")
+                    export = False
+                else:
+                    print("Static export enabled, dash will not be launched.")
+                    export = True
+            case "sqlite" | "parquet" | "prometheus":
+                if user_input in sinks:
+                    print(f"Export to {user_input} disabled.")
+                    sinks.remove(user_input)
+                elif not sk.SINKS[user_input].available():
+                    print(f"Export to {user_input} needs packages that are "
+                          "not installed (see data.sinks).")
+                else:
+                    print(f"Export to {user_input} enabled.")
+                    sinks.append(user_input)
             case "config":
                 print("\nCurrent configuration of parameters:")
                 config = textwrap.dedent(f"""\
                     headless = {headless}
+                    lean = {lean}
+                    profile_dir = {profile_dir}
                     type = {type}
+                    comps = {[fp.comp_label(comp) for comp in comps]}
                     debug = {debug}
                     port = {port}
+                    compact = {compact}
+                    export = {export}
+                    sinks = {sinks}
                 """)
                 print(config)
                 print("Logs:")
@@ -105,7 +179,8 @@ def user_input():
                     print("This does not seem to be a valid input.")
     if not logs:
         logs = predef_links()
-    full_input = FullInput(logs, headless, type, debug, port)
+    full_input = FullInput(logs, headless, type, debug, port, compact,
+                           export, sinks, lean, profile_dir, comps)
     return full_input
 
 
@@ -122,11 +197,11 @@ def predef_links(num: int = 1) -> list[str]:
       num: Integer between 1 and 5, corresponding to 5 different test sets of
         log urls.
 
-      1: 1 log, kills, wipes, valid group
-      2: 2 logs, kills, wipes, valid group
-      3: 3 logs, kills, wipes, invalid group
-      4: 2 logs, no kills, wipes, valid group
-      5: 8 logs, no kills, wipes, valid group
+      1: 1 log, kills, wipes, one group comp
+      2: 2 logs, kills, wipes, one group comp
+      3: 3 logs, kills, wipes, two different group comps
+      4: 2 logs, no kills, wipes, one group comp
+      5: 8 logs, no kills, wipes, one group comp
 
     Returns:
       A list of strings, each being the url of an fflog.